@@ -1,5 +1,7 @@
 # Libraries
-from dash import dcc, html, Dash
+from dash import dcc, html, Dash, no_update
+from flask import request
+from urllib.parse import urljoin
 from dash.dependencies import Output, Input
 import dash_bootstrap_components as dbc
 import feffery_markdown_components as fmc
@@ -8,9 +10,14 @@ from utils.app_setup import (
     YEAR_PLACE_OPTIONS,
     PLACE_YEAR_OPTIONS,
     ALL_YEARS,
+    DATA_SOURCE_URL,
+    TILES_URL,
+    SERVER_RENDERING,
     footer_string,
     geodata_map, geodata_plot
 )
+from utils.routes import register_data_routes, register_tile_routes, register_figure_routes, register_figure_cache_route, data_version
+from utils.figures import HOVERTEMPLATES, COUNTY_MAP, FigureCache, load_payloads, load_lat_lon_center_points, selection, choropleth_figure, county_figure, plot_figure
 
 
 # -- -- --
@@ -39,6 +46,9 @@ app = Dash(__name__,
 server = app.server
 app.title = 'Rent Burden in Los Angeles County'
 
+register_data_routes(server)
+register_tile_routes(server)
+
 
 
 app.layout = dbc.Container([
@@ -149,8 +159,12 @@ app.layout = dbc.Container([
     ]),
 
     # Data
+    dcc.Store( id = 'DATA_SOURCE', data = {'url': DATA_SOURCE_URL, 'tiles': TILES_URL, 'figures': app.get_relative_path('/figures'), 'version': data_version()} ),
     dcc.Store( id = 'MASTERFILE' ),
+    dcc.Store( id = 'SELECTION' ),
     dcc.Store( id = 'LAT-LON' ),
+    dcc.Store( id = 'HOVERTEMPLATES', data = HOVERTEMPLATES ),
+    dcc.Store( id = 'COUNTY_MAP', data = COUNTY_MAP ),
     dcc.Store( id = 'YEAR_PLACE_OPTIONS', data = YEAR_PLACE_OPTIONS ),
     dcc.Store( id = 'PLACE_YEAR_OPTIONS', data = PLACE_YEAR_OPTIONS ),
 
@@ -163,6 +177,7 @@ app.layout = dbc.Container([
 # Data:
 #  place value -> masterfile data
 #  year value -> lat/lon center point data
+#  (server-rendered mode: place value, year value -> selection, census tract options)
 #
 # Dropdowns:
 #  year value -> place options
@@ -171,11 +186,11 @@ app.layout = dbc.Container([
 #  click data -> census tract value
 #
 # Titles:
-#  place value, year value, radio options -> map title
+#  place value, year value, map view, radio options -> map title
 #  place value, census tract value -> plot title
 #
 # Graphs:
-#  place value, year value, census tract value, radio options -> map
+#  place value, year value, census tract value, map view, radio options -> map
 #  place value, census tract value, radio options -> plot
 #
 # ----------------------------------- #
@@ -184,33 +199,93 @@ app.layout = dbc.Container([
 # Data
 # -- -- -- --
 
-# Masterfile
-app.clientside_callback(
-    """
-    async function(selected_place) {
-        const url = `https://raw.githubusercontent.com/ramindersinghdubb/Rent-Burden-in-LA-County/refs/heads/main/data/masterfiles/${selected_place}_masterfile.json`;
-        const response = await fetch(url);
-        const data = await response.json();
-        return data;
-    }
-    """,
-    Output('MASTERFILE', 'data'),
-    Input('place-dropdown', 'value')
-)
-
-# Latitudinal/longitudinal center points
-app.clientside_callback(
-    """
-    async function(selected_year) {
-        const url = `https://raw.githubusercontent.com/ramindersinghdubb/Rent-Burden-in-LA-County/refs/heads/main/data/lat_lon_center_points/${selected_year}_latlon_center_points.json`;
-        const response = await fetch(url);
-        const data = await response.json();
-        return data;
-    }
-    """,
-    Output('LAT-LON', 'data'),
-    Input('year-dropdown', 'value')
-)
+# Server-rendered mode: the payloads and center points stay on the server, which only sends the
+# selected place's name and census tract options; the figures are fetched from `/figures` (see Graphs)
+if SERVER_RENDERING:
+    PAYLOADS = load_payloads()
+    CENTER_POINTS = load_lat_lon_center_points()
+
+    # Selection and census tract options
+    @app.callback(
+        [Output('SELECTION', 'data'),
+         Output('census-tract-dropdown', 'options')
+        ],
+        [Input('place-dropdown', 'value'),
+         Input('year-dropdown', 'value')
+        ]
+    )
+    def place_selection(selected_place, selected_year):
+        if selected_place not in PAYLOADS:
+            return no_update, no_update
+        year_cols, _ = selection(PAYLOADS[selected_place], selected_year, None)
+        return {'CITY': PAYLOADS[selected_place]['CITY']}, [row[0] for row in year_cols['CUSTOMDATA']]
+
+else:
+    # Masterfile
+    app.clientside_callback(
+        """
+        async function(selected_place, DATA_SOURCE) {
+            const url = `${DATA_SOURCE.url}/payloads/${selected_place}_payload.json?v=${DATA_SOURCE.version}`;
+            const response = await fetch(url);
+            const data = await response.json();
+            return data;
+        }
+        """,
+        Output('MASTERFILE', 'data'),
+        [Input('place-dropdown', 'value'),
+         Input('DATA_SOURCE', 'data')
+        ]
+    )
+
+    # Selection, i.e. the rows of the selected year and the time series of the selected tract,
+    # resolved through the payload's indices. The series only spans the tract vintage of the selected
+    # year; 2020 tracts are extended with their harmonized pre-2020 years (see utils/figures.py `selection`).
+    app.clientside_callback(
+        """
+        function(selected_year, selected_tract, MASTERFILE) {
+            const COLUMNS = MASTERFILE['COLUMNS'];
+            const CUSTOMDATA = MASTERFILE['CUSTOMDATA'];
+            const SERIES = MASTERFILE['SERIES'];
+            const [start, stop] = MASTERFILE['YEAR_INDEX'][selected_year] || [0, 0];
+
+            const vintage = year => (year >= 2020 ? 2020 : 2010);
+            const tract_rows  = (MASTERFILE['TRACT_INDEX'][selected_tract] || []).filter(i => vintage(COLUMNS['YEAR'][i]) === vintage(selected_year));
+            const series_rows = (vintage(selected_year) === 2020) ? (SERIES['TRACT_INDEX'][selected_tract] || []) : [];
+
+            var year_view = {};
+            var tract_view = {};
+            for (const col in COLUMNS) {
+                year_view[col]  = COLUMNS[col].slice(start, stop);
+                tract_view[col] = series_rows.map(i => SERIES['COLUMNS'][col][i]).concat(tract_rows.map(i => COLUMNS[col][i]));
+            }
+            year_view['CUSTOMDATA']  = CUSTOMDATA.slice(start, stop);
+            tract_view['CUSTOMDATA'] = series_rows.map(i => SERIES['CUSTOMDATA'][i]).concat(tract_rows.map(i => CUSTOMDATA[i]));
+        
+            return {'CITY': MASTERFILE['CITY'], 'YEAR': year_view, 'TRACT': tract_view};
+        }
+        """,
+        Output('SELECTION', 'data'),
+        [Input('year-dropdown', 'value'),
+         Input('census-tract-dropdown', 'value'),
+         Input('MASTERFILE', 'data')
+        ]
+    )
+
+    # Latitudinal/longitudinal center points
+    app.clientside_callback(
+        """
+        async function(selected_year, DATA_SOURCE) {
+            const url = `${DATA_SOURCE.url}/lat_lon_center_points/${selected_year}_latlon_center_points.json?v=${DATA_SOURCE.version}`;
+            const response = await fetch(url);
+            const data = await response.json();
+            return data;
+        }
+        """,
+        Output('LAT-LON', 'data'),
+        [Input('year-dropdown', 'value'),
+         Input('DATA_SOURCE', 'data')
+        ]
+    )
 
 
 # -- -- -- --
@@ -243,21 +318,17 @@ app.clientside_callback(
     ]
 )
 
-# Census tract options
-app.clientside_callback(
-    """
-    function(selected_place, selected_year, MASTERFILE) {
-        var options = MASTERFILE.filter(x => x['YEAR'] === selected_year);
-        var tract_options = options.map(item => { return item.TRACT });
-        return tract_options
-    }
-    """,
-    Output('census-tract-dropdown', 'options'),
-    [Input('place-dropdown', 'value'),
-     Input('year-dropdown', 'value'),
-     Input('MASTERFILE', 'data')
-    ]
-)
+# Census tract options (server-rendered mode: see Data)
+if not SERVER_RENDERING:
+    app.clientside_callback(
+        """
+        function(SELECTION) {
+            return SELECTION['YEAR']['CUSTOMDATA'].map(row => row[0])
+        }
+        """,
+        Output('census-tract-dropdown', 'options'),
+        Input('SELECTION', 'data')
+    )
 
 
 
@@ -265,7 +336,7 @@ app.clientside_callback(
 app.clientside_callback(
     """
     function(clickData) {
-        return clickData['points']['0']['customdata']
+        return clickData['points']['0']['customdata'][0]
     }
     """,
     Output('census-tract-dropdown', 'value'),
@@ -283,10 +354,8 @@ app.clientside_callback(
 # Map title
 app.clientside_callback(
     """
-    function(selected_metric, selected_place, selected_year, MASTERFILE) {
-        var my_array = MASTERFILE.filter(item => item['YEAR'] === selected_year);
-        var city_array = my_array.map(({CITY}) => CITY);
-        var selected_city = city_array[0];
+    function(selected_metric, selected_place, selected_year, map_view, SELECTION) {
+        var selected_city = (map_view === 'County') ? 'Los Angeles County' : SELECTION['CITY'];
 
         if ( ['Rent Burden', 'Rent Burden by Age'].includes(selected_metric) ) {
             var title = 'Percentage of Rent Burdened Individuals';
@@ -304,25 +373,26 @@ app.clientside_callback(
     [Input('measure-dropdown', 'value'),
      Input('place-dropdown', 'value'),
      Input('year-dropdown', 'value'),
-     Input('MASTERFILE', 'data')
+     Input('map-view', 'value'),
+     Input('SELECTION', 'data')
     ]
 )
 
 # Plot title
 app.clientside_callback(
     """
-    function(selected_tract, MASTERFILE) {
+    function(selected_tract, SELECTION) {
         if (selected_tract == undefined){
             return "Please click on a tract.";
         } else {
-            var selected_city = MASTERFILE[0]['CITY'];
+            var selected_city = SELECTION['CITY'];
             return `${selected_city}, ${selected_tract}`;
         }
     }
     """,
     Output('plot-title', 'children'),
     [Input('census-tract-dropdown', 'value'),
-     Input('MASTERFILE', 'data')
+     Input('SELECTION', 'data')
     ]
 )
 
@@ -331,206 +401,264 @@ app.clientside_callback(
 # Graphs
 # -- -- --
 
-# Choropleth map
-app.clientside_callback(
-    """
-    function(selected_metric, selected_place, selected_year, selected_tract, MASTERFILE, LAT_LON){
-        var my_array = MASTERFILE.filter(item => item['YEAR'] === selected_year);
-        
-        var url_path = `https://raw.githubusercontent.com/ramindersinghdubb/Rent-Burden-in-LA-County/refs/heads/main/data/mastergeometries/${selected_year}_mastergeometry.geojson`;
-        
-        var locations_array  = my_array.map( ({GEO_ID}) => GEO_ID );
-        var customdata_array = my_array.map( ({TRACT}) => TRACT );
-        
-        var lat_lon_array = LAT_LON.filter(item => item['ABBREV_NAME'] === selected_place);
-        const lon_center  = lat_lon_array[0]['LON_CENTER'];
-        const lat_center  = lat_lon_array[0]['LAT_CENTER'];
-
-        if ( ['Rent Burden', 'Rent Burden by Age'].includes(selected_metric) ) {
-            var z_array = my_array.map( ({TotalRentBurden}) => TotalRentBurden );
-            var strings = my_array.map(function(item) {
-                return "<b style='font-size:16px;'>" + item['TRACT'] + "</b><br>" + item['CITY'] + ", Los Angeles County<br><br>"
-                + "Of the estimated " + item['B25070_001E'] + " renters, approx. <b style='font-size:16px; color:#800000;'>" + item['TotalRentBurden'] + "%</b><br>"
-                + "were considered <b style='font-size:16px; color:#800000;'>rent-burdened</b> during <b style='font-size:14px'>" + item['YEAR'] + "</b>.<extra></extra>";
-                });
-            var colorscale = 'YlOrRd';
-            var colorbar_title = 'Percentage of<br>Rent-Burdened<br>Individuals (%)';
-        } else {
-            var z_array = my_array.map( ({TotalSevereRentBurden}) => TotalSevereRentBurden );
-            var strings = my_array.map(function(item) {
-                return "<b style='font-size:16px;'>" + item['TRACT'] + "</b><br>" + item['CITY'] + ", Los Angeles County<br><br>"
-                + "Of the estimated " + item['B25070_001E'] + " renters, approx. <b style='font-size:16px; color:#610000;'>" + item['TotalSevereRentBurden'] + "%</b><br>"
-                + "were considered <b style='font-size:16px; color:#610000;'>severely rent-burdened</b><br>during <b style='font-size:14px'>" + item['YEAR'] + "</b>.<extra></extra>";
-                });
-            var colorscale = 'Hot';
-            var colorbar_title = 'Percentage of<br>Severely<br>Rent-Burdened<br>Individuals (%)';
+# Server-rendered mode: the figures are built from the preloaded payloads, kept as JSON in a
+# bounded LRU cache keyed by the full input tuple (counters at `/cache/figures`), and fetched
+# from `/figures`, so that cache hits are sent without being serialized again
+if SERVER_RENDERING:
+    figure_cache = FigureCache(maxsize = 512)
+
+    def map_figure(metric, year, view = 'Place', place = None, tract = None):
+        year = int(year)
+        if view == 'County':
+            tilejson_url = urljoin(request.host_url, f'{TILES_URL}/{year}.json?v={data_version()}')
+            return county_figure(metric, year, tilejson_url)
+        if place not in PAYLOADS or (year, place) not in CENTER_POINTS:
+            return None
+        url_path = f'{DATA_SOURCE_URL}/mastergeometries/{year}/{place}.geojson?v={data_version()}'
+        return choropleth_figure(PAYLOADS[place], CENTER_POINTS[(year, place)], metric, year, tract, url_path)
+
+    def rent_plot_figure(metric, place, year, tract):
+        if place not in PAYLOADS:
+            return None
+        return plot_figure(PAYLOADS[place], metric, int(year), tract)
+
+    register_figure_routes(server, figure_cache, {'map': map_figure, 'plot': rent_plot_figure})
+    register_figure_cache_route(server, figure_cache)
+
+    # Choropleth map (the county view does not depend on the place or tract)
+    app.clientside_callback(
+        """
+        async function(selected_metric, selected_place, selected_year, selected_tract, map_view, DATA_SOURCE) {
+            var inputs = {'metric': selected_metric, 'year': selected_year, 'view': map_view, 'v': DATA_SOURCE.version};
+            if (map_view !== 'County') {
+                inputs['place'] = selected_place;
+                if (selected_tract != undefined) {
+                    inputs['tract'] = selected_tract;
+                }
+            }
+            const response = await fetch(`${DATA_SOURCE.figures}/map.json?${new URLSearchParams(inputs)}`);
+            if (response.status !== 200) {
+                return window.dash_clientside.no_update;
+            }
+            return await response.json();
         }
-        
-        var data = [{
-            'type': 'choroplethmap',
-            'customdata': customdata_array,
-            'geojson': url_path,
-            'locations': locations_array,
-            'featureidkey': 'properties.GEO_ID',
-            'colorscale': colorscale,
-            'reversescale': true,
-            'z': z_array,
-            'marker': {'line': {'color': '#020403', 'width': 1.75}, 'opacity': 0.7},
-            'text': strings,
-            'colorbar': {'outlinewidth': 2,
-                         'ticklabelposition': 'outside bottom',
-                         'ticksuffix': '%',
-                         'title': {'font': {'color': '#020403', 'weight': 500}, 'text': colorbar_title}},
-            'hoverlabel': {'bgcolor': '#FAFAFA', 'bordercolor': '#BEBEBE', 'font': {'color': '#020403'}},
-            'hovertemplate': '%{text}'
-        }];
-        
-        var layout = {
-            'autosize': true,
-            'hoverlabel': {'align': 'left'},
-            'map': {'center': {'lat': lat_center, 'lon': lon_center}, 'style': 'streets', 'zoom': 10},
-            'margin': {'b': 0, 'l': 0, 'r': 0, 't': 0},
-            'paper_bgcolor': '#FEF9F3',
-            'plot_bgcolor': '#FEF9F3',
-        };
-        
-        if (selected_tract != undefined){
-            var aux_array           = my_array.filter(item => item['TRACT'] === selected_tract);
-            var aux_locations_array = aux_array.map( ({GEO_ID}) => GEO_ID );
-            var aux_z_array         = aux_array.map( ({GEO_ID}) => GEO_ID );
-        
-            var aux_data = {
-                'type': 'choroplethmap',
-                'geojson': url_path,
-                'locations': aux_locations_array,
-                'featureidkey': 'properties.GEO_ID',
-                'colorscale': [[0, 'rgba(0,0,0,0)'], [1, 'rgba(0,0,0,0)']],
-                'showscale': false,
-                'z': aux_z_array,
-                'zmin': 0, 'zmax': 1,
-                'marker': {'line': {'color': '#04D9FF', 'width': 4}},
-                'selected': {'marker': {'opacity': 0.4}},
-                'hoverinfo': 'skip',
+        """,
+        Output('chloropleth_map', 'figure'),
+        [Input('measure-dropdown', 'value'),
+         Input('place-dropdown', 'value'),
+         Input('year-dropdown', 'value'),
+         Input('census-tract-dropdown', 'value'),
+         Input('map-view', 'value'),
+         Input('DATA_SOURCE', 'data')
+        ]
+    )
+
+    # Plot
+    app.clientside_callback(
+        """
+        async function(selected_metric, selected_place, selected_tract, selected_year, DATA_SOURCE) {
+            if (selected_tract == undefined) {
+                return window.dash_clientside.no_update;
             }
-            
-            data.push(aux_data);
+            const inputs = {'metric': selected_metric, 'place': selected_place, 'year': selected_year, 'tract': selected_tract, 'v': DATA_SOURCE.version};
+            const response = await fetch(`${DATA_SOURCE.figures}/plot.json?${new URLSearchParams(inputs)}`);
+            if (response.status !== 200) {
+                return window.dash_clientside.no_update;
+            }
+            return await response.json();
         }
-        
-        return {'data': data, 'layout': layout};
-    }
-    """,
-    Output('chloropleth_map', 'figure'),
-    [Input('measure-dropdown', 'value'),
-     Input('place-dropdown', 'value'),
-     Input('year-dropdown', 'value'),
-     Input('census-tract-dropdown', 'value'),
-     Input('MASTERFILE', 'data'),
-     Input('LAT-LON', 'data')
-    ]
-)
-
+        """,
+        Output('rent_plot', 'figure'),
+        [Input('measure-dropdown', 'value'),
+         Input('place-dropdown', 'value'),
+         Input('census-tract-dropdown', 'value'),
+         Input('year-dropdown', 'value'),
+         Input('DATA_SOURCE', 'data')
+        ]
+    )
+
+else:
+    # Choropleth map
+    app.clientside_callback(
+        """
+        function(selected_metric, selected_place, selected_year, selected_tract, map_view, SELECTION, LAT_LON, DATA_SOURCE, HOVERTEMPLATES, COUNTY_MAP){
+            // Zoom at which a bounding box fills 90% of the graph (see utils/figures.py `map_zoom`)
+            const map_zoom = function(bounds) {
+                const graph  = (typeof document !== 'undefined') ? document.getElementById('chloropleth_map') : null;
+                const width  = (graph && graph.clientWidth) || 700;
+                const height = (graph && graph.clientHeight) || 450;
+                const mercator_y = lat => Math.asinh(Math.tan(lat * Math.PI / 180));
+                const x_span = Math.max((bounds[2] - bounds[0]) / 360, 1e-9);
+                const y_span = Math.max((mercator_y(bounds[3]) - mercator_y(bounds[1])) / (2 * Math.PI), 1e-9);
+                const zoom = Math.log2(0.9 * Math.min(width / x_span, height / y_span) / 512);
+                return Math.round(Math.min(Math.max(zoom, 3), 15) * 100) / 100;
+            };
 
+            // County-wide view: one fill layer of the year's vector tiles per class (see utils/figures.py `county_figure`)
+            if (map_view === 'County') {
+                const z_col    = ['Rent Burden', 'Rent Burden by Age'].includes(selected_metric) ? 'TotalRentBurden' : 'TotalSevereRentBurden';
+                const classes  = COUNTY_MAP['CLASSES'][z_col];
+                const breaks   = classes['BREAKS'];
+                const base_url = (typeof window !== 'undefined') ? window.location.href : 'http://localhost/';
+                const tilejson_url = new URL(`${DATA_SOURCE.tiles}/${selected_year}.json?v=${DATA_SOURCE.version}`, base_url).href;
+
+                const labels = breaks.slice(0, -1).map((low, k) => `${low}% to ${breaks[k + 1]}%`).concat([`${breaks[breaks.length - 1]}% and over`]);
+                var data = classes['COLORS'].map((color, k) => ({
+                    'type': 'scattermap', 'lat': [], 'lon': [], 'mode': 'markers', 'name': labels[k],
+                    'marker': {'color': color, 'size': 12}, 'hoverinfo': 'skip'
+                }));
+
+                var layers = classes['COLORS'].map((color, k) => ({
+                    'sourcetype': 'vector', 'source': tilejson_url, 'sourcelayer': `${z_col}_${k}`,
+                    'type': 'fill', 'color': color, 'opacity': 0.7
+                }));
+                layers.push({'sourcetype': 'vector', 'source': tilejson_url, 'sourcelayer': 'tracts',
+                             'type': 'line', 'color': '#020403', 'line': {'width': 0.5}});
 
-# Plot
-app.clientside_callback(
-    """
-    function(selected_metric, selected_place, selected_tract, selected_year, MASTERFILE){        
-        if (selected_tract != undefined) {
-            var my_array = MASTERFILE.filter(item => item['TRACT'] === selected_tract);
-            var my_array = my_array.sort((a, b) => a.YEAR - b.YEAR);
-            
-            var x_array = my_array.map( ({YEAR}) => YEAR) ;
-
-            if ( selected_metric == 'Rent Burden' ) {
-                var y_array = my_array.map( ({TotalRentBurden}) => TotalRentBurden );
-
-                var strings = my_array.map(function(item) {
-                    function str_parse(col) {
-                        return isNaN( parseFloat(item[col]) ) ? 'Not Available' : parseFloat(item[col]).toString() + '%';
-                    }
-
-                    const RB_15to24 = str_parse('RentBurden_15to24');
-                    const RB_25to34 = str_parse('RentBurden_25to34');
-                    const RB_35to64 = str_parse('RentBurden_35to64');
-                    const RB_65 = str_parse('RentBurden_65+');
-
-                    return "<b style='font-size:16px;'>" + item['YEAR'] + "</b><br>" + item['TRACT'] + ", " + item['CITY'] + " <br><br>"
-                    + "Of the estimated " + item['B25070_001E'] + " renters, approx.<br><b style='font-size:16px; color:#800000;'>" + item['TotalRentBurden'] + "%</b> "
-                    + "were considered <b style='font-size:16px; color:#800000;'>rent-burdened</b>.<extra></extra>";
-                });
-                var plot_title = `<b>Percentage of Rent Burdened Individuals</b>, ${Math.min(...x_array)} to ${Math.max(...x_array)}`;
-                var line_color = '#C0451C';
-            }
-            if ( selected_metric == 'Severe Rent Burden' ) {
-                var y_array = my_array.map( ({TotalSevereRentBurden}) => TotalSevereRentBurden );
-                var strings = my_array.map(function(item) {
-                    return "<b style='font-size:16px;'>" + item['YEAR'] + "</b><br>" + item['TRACT'] + ", " + item['CITY'] + " <br><br>"
-                    + "Of the estimated " + item['B25070_001E'] + " renters, approx. <b style='font-size:16px; color:#610000;'>" + item['TotalSevereRentBurden'] + "%</b><br>"
-                    + "were considered <b style='font-size:16px; color:#610000;'>severely rent-burdened</b> <br>during <b style='font-size:14px'>" + item['YEAR'] + "</b>.<extra></extra>";
-                });
-                var plot_title = `<b>Percentage of Severely Rent Burdened Individuals</b>, ${Math.min(...x_array)} to ${Math.max(...x_array)}`;
-                var line_color = '#800000';
+                var layout = {
+                    'autosize': true,
+                    'legend': {'title': {'text': `<b>${selected_year}</b>`}, 'bgcolor': 'rgba(254,249,243,0.8)', 'x': 0.01, 'y': 0.99},
+                    'map': {'center': COUNTY_MAP['CENTER'], 'style': 'streets', 'zoom': map_zoom(COUNTY_MAP['BOUNDS']), 'layers': layers},
+                    'margin': {'b': 0, 'l': 0, 'r': 0, 't': 0},
+                    'paper_bgcolor': '#FEF9F3',
+                    'plot_bgcolor': '#FEF9F3',
+                };
+                return {'data': data, 'layout': layout};
             }
 
+            const my_cols = SELECTION['YEAR'];
+        
+            var url_path = `${DATA_SOURCE.url}/mastergeometries/${selected_year}/${selected_place}.geojson?v=${DATA_SOURCE.version}`;
+        
+            var lat_lon_array = LAT_LON.filter(item => item['ABBREV_NAME'] === selected_place);
+            const lon_center  = lat_lon_array[0]['LON_CENTER'];
+            const lat_center  = lat_lon_array[0]['LAT_CENTER'];
+
+            // Zoom at which the place's bounding box fills the graph (10 without a bounding box)
+            const bounds = lat_lon_array[0]['BOUNDS'];
+            var zoom = (bounds != undefined) ? map_zoom(bounds) : 10;
+
+            if ( ['Rent Burden', 'Rent Burden by Age'].includes(selected_metric) ) {
+                var z_array = my_cols['TotalRentBurden'];
+                var reliability_array = my_cols['TotalRentBurden_RELIABILITY'];
+                var hovertemplate = HOVERTEMPLATES['map']['Rent Burden'];
+                var colorscale = 'YlOrRd';
+                var colorbar_title = 'Percentage of<br>Rent-Burdened<br>Individuals (%)';
+            } else {
+                var z_array = my_cols['TotalSevereRentBurden'];
+                var reliability_array = my_cols['TotalSevereRentBurden_RELIABILITY'];
+                var hovertemplate = HOVERTEMPLATES['map']['Severe Rent Burden'];
+                var colorscale = 'Hot';
+                var colorbar_title = 'Percentage of<br>Severely<br>Rent-Burdened<br>Individuals (%)';
+            }
+        
             var data = [{
-                'type': 'scatter',
-                'x': x_array,
-                'y': y_array,
-                'mode': 'lines+markers',
-                'line': {'color': line_color},
-                'marker': {'size': 10, 'line': {'width': 2, 'color': '#F5FBFF'}},
-                'text': strings,
+                'type': 'choroplethmap',
+                'customdata': my_cols['CUSTOMDATA'],
+                'meta': SELECTION['CITY'],
+                'geojson': url_path,
+                'locations': my_cols['GEO_ID'],
+                'featureidkey': 'properties.GEO_ID',
+                'colorscale': colorscale,
+                'reversescale': true,
+                'z': z_array,
+                // Tracts with low-reliability estimates (CV above 40%) are dimmed
+                'marker': {'line': {'color': '#020403', 'width': 1.75}, 'opacity': reliability_array.map(r => [0.7, 0.7, 0.25][r])},
+                'colorbar': {'outlinewidth': 2,
+                             'ticklabelposition': 'outside bottom',
+                             'ticksuffix': '%',
+                             'title': {'font': {'color': '#020403', 'weight': 500}, 'text': colorbar_title}},
                 'hoverlabel': {'bgcolor': '#FAFAFA', 'bordercolor': '#BEBEBE', 'font': {'color': '#020403'}},
-                'hovertemplate': '%{text}'
+                'hovertemplate': hovertemplate
             }];
-
+        
             var layout = {
-                'font': {'color': '#020403'},
-                'hoverlabel': {'align': 'left'},
-                'margin': {'b': 40, 't': 40, 'r': 20},
                 'autosize': true,
-                'uirevision': true,
+                'hoverlabel': {'align': 'left'},
+                'map': {'center': {'lat': lat_center, 'lon': lon_center}, 'style': 'streets', 'zoom': zoom},
+                'margin': {'b': 0, 'l': 0, 'r': 0, 't': 0},
                 'paper_bgcolor': '#FEF9F3',
                 'plot_bgcolor': '#FEF9F3',
-                'title': {'text': plot_title, 'x': 0.05},
-                'xaxis': {'title': {'text': '<b>Year</b>', 'ticklabelstandoff': 10, 'font': {'size': 14}}, 'showgrid': false, 'tick0': Math.min(...x_array), 'dtick': 2, 'ticks': '', 'tickfont': {'color': '#666666'}},
-                'yaxis': {'title': {'text': '<b>Percentage (%)</b>', 'standoff': 15, 'font': {'size': 14}}, 'ticksuffix': '%', 'gridcolor': '#E0E0E0', 'ticklabelstandoff': 5, 'ticks': '', 'tickfont': {'color': '#666666'}},
             };
-
-            if (selected_metric == 'Rent Burden by Age') {
-                var my_array = my_array.filter(item => item['YEAR'] == selected_year);
-
-                const age_groups = ['RentBurden_15to24', 'RentBurden_25to34', 'RentBurden_35to64', 'RentBurden_65+'];
-                var y_array = age_groups.map(key => my_array[0][key]);
-
-                function str_parse(col) {
-                    return isNaN( parseFloat(my_array[0][col]) ) ? 'Not Available' : parseFloat(my_array[0][col]).toString() + '%';
+        
+            if (selected_tract != undefined){
+                const tract_cols        = SELECTION['TRACT'];
+                var aux_locations_array = tract_cols['GEO_ID'].filter((_, i) => tract_cols['YEAR'][i] === selected_year);
+                var aux_z_array         = aux_locations_array;
+        
+                var aux_data = {
+                    'type': 'choroplethmap',
+                    'geojson': url_path,
+                    'locations': aux_locations_array,
+                    'featureidkey': 'properties.GEO_ID',
+                    'colorscale': [[0, 'rgba(0,0,0,0)'], [1, 'rgba(0,0,0,0)']],
+                    'showscale': false,
+                    'z': aux_z_array,
+                    'zmin': 0, 'zmax': 1,
+                    'marker': {'line': {'color': '#04D9FF', 'width': 4}},
+                    'selected': {'marker': {'opacity': 0.4}},
+                    'hoverinfo': 'skip',
+                }
+            
+                data.push(aux_data);
+            }
+        
+            return {'data': data, 'layout': layout};
+        }
+        """,
+        Output('chloropleth_map', 'figure'),
+        [Input('measure-dropdown', 'value'),
+         Input('place-dropdown', 'value'),
+         Input('year-dropdown', 'value'),
+         Input('census-tract-dropdown', 'value'),
+         Input('map-view', 'value'),
+         Input('SELECTION', 'data'),
+         Input('LAT-LON', 'data'),
+         Input('DATA_SOURCE', 'data'),
+         Input('HOVERTEMPLATES', 'data'),
+         Input('COUNTY_MAP', 'data')
+        ]
+    )
+
+
+
+    # Plot
+    app.clientside_callback(
+        """
+        function(selected_metric, selected_place, selected_tract, selected_year, SELECTION, HOVERTEMPLATES){        
+            if (selected_tract != undefined) {
+                // Time series of the tract, already in year order
+                const tract_cols = SELECTION['TRACT'];
+                var x_array = tract_cols['YEAR'];
+                if (x_array.length === 0) {
+                    // The tract is not on the tract vintage of the selected year
+                    return window.dash_clientside.no_update;
                 }
 
-                const RB_15to24 = str_parse('RentBurden_15to24');
-                const RB_25to34 = str_parse('RentBurden_25to34');
-                const RB_35to64 = str_parse('RentBurden_35to64');
-                const RB_65 = str_parse('RentBurden_65+');
-
-                var strings = [
-                    "Of renters <b style='color:#B22222;'>15 to 24 year old</b>, approx.<br><b style='color:#B22222; font-size:14px;'>" + RB_15to24 + "</b> were rent-burdened.<extra></extra>",
-                    "Of renters <b style='color:#B22222;'>25 to 34 year old</b>, approx.<br><b style='color:#B22222; font-size:14px;'>" + RB_25to34 + "</b> were rent-burdened.<extra></extra>",
-                    "Of renters <b style='color:#B22222;'>35 to 64 year old</b>, approx.<br><b style='color:#B22222; font-size:14px;'>" + RB_35to64 + "</b> were rent-burdened.<extra></extra>",
-                    "Of renters <b style='color:#B22222;'>65 and older</b>, approx.<br><b style='color:#B22222; font-size:14px;'>" + RB_65 + "</b> were rent-burdened.<extra></extra>"
-                ]
-
-                var strings = strings.map((item) => "<b style='font-size:16px;'>" + my_array[0]['YEAR'] + "</b><br>" + my_array[0]['TRACT'] + ", " + my_array[0]['CITY'] + " <br><br>" + item );
+                if ( selected_metric == 'Rent Burden' ) {
+                    var y_array = tract_cols['TotalRentBurden'];
+                    var plot_title = `<b>Percentage of Rent Burdened Individuals</b>, ${Math.min(...x_array)} to ${Math.max(...x_array)}`;
+                    var line_color = '#C0451C';
+                }
+                if ( selected_metric == 'Severe Rent Burden' ) {
+                    var y_array = tract_cols['TotalSevereRentBurden'];
+                    var plot_title = `<b>Percentage of Severely Rent Burdened Individuals</b>, ${Math.min(...x_array)} to ${Math.max(...x_array)}`;
+                    var line_color = '#800000';
+                }
 
                 var data = [{
-                    'type': 'bar',
-                    'x': ['15 to 24', '25 to 34', '35 to 64', '65+'],
+                    'type': 'scatter',
+                    'x': x_array,
                     'y': y_array,
-                    'marker': {'color': '#800000', 'line': {'color': '#666666', 'width': 2}, 'opacity': 0.8},
-                    'text': strings,
-                    'textposition': 'none',
+                    'mode': 'lines+markers',
+                    'line': {'color': line_color},
+                    'marker': {'size': 10, 'line': {'width': 2, 'color': '#F5FBFF'}},
+                    'customdata': tract_cols['CUSTOMDATA'],
+                    'meta': SELECTION['CITY'],
                     'hoverlabel': {'bgcolor': '#FAFAFA', 'bordercolor': '#BEBEBE', 'font': {'color': '#020403'}},
-                    'hovertemplate': '%{text}'
+                    'hovertemplate': HOVERTEMPLATES['plot'][selected_metric]
                 }];
+
                 var layout = {
                     'font': {'color': '#020403'},
                     'hoverlabel': {'align': 'left'},
@@ -539,24 +667,56 @@ app.clientside_callback(
                     'uirevision': true,
                     'paper_bgcolor': '#FEF9F3',
                     'plot_bgcolor': '#FEF9F3',
-                    'title': {'text': `<b>Percentage of Rent Burdened Individuals by Age</b>, ${selected_year}`, 'x': 0.05},
-                    'xaxis': {'title': {'text': '<b>Age Group</b>', 'ticklabelstandoff': 10, 'font': {'size': 14}}, 'showgrid': false, 'ticks': '', 'tickfont': {'color': '#666666', 'size': 13}},
+                    'title': {'text': plot_title, 'x': 0.05},
+                    'xaxis': {'title': {'text': '<b>Year</b>', 'ticklabelstandoff': 10, 'font': {'size': 14}}, 'showgrid': false, 'tick0': Math.min(...x_array), 'dtick': 2, 'ticks': '', 'tickfont': {'color': '#666666'}},
                     'yaxis': {'title': {'text': '<b>Percentage (%)</b>', 'standoff': 15, 'font': {'size': 14}}, 'ticksuffix': '%', 'gridcolor': '#E0E0E0', 'ticklabelstandoff': 5, 'ticks': '', 'tickfont': {'color': '#666666'}},
                 };
-            }
+
+                if (selected_metric == 'Rent Burden by Age') {
+                    const i = x_array.indexOf(selected_year);
+                    if (i < 0) { return window.dash_clientside.no_update; }
+
+                    const age_groups = ['RentBurden_15to24', 'RentBurden_25to34', 'RentBurden_35to64', 'RentBurden_65+'];
+                    var y_array = age_groups.map(key => tract_cols[key][i]);
+
+                    var data = [{
+                        'type': 'bar',
+                        'x': ['15 to 24', '25 to 34', '35 to 64', '65+'],
+                        'y': y_array,
+                        'marker': {'color': '#800000', 'line': {'color': '#666666', 'width': 2}, 'opacity': 0.8},
+                        'customdata': ['15 to 24 year old', '25 to 34 year old', '35 to 64 year old', '65 and older'],
+                        'meta': [selected_year, selected_tract, SELECTION['CITY']],
+                        'hoverlabel': {'bgcolor': '#FAFAFA', 'bordercolor': '#BEBEBE', 'font': {'color': '#020403'}},
+                        'hovertemplate': HOVERTEMPLATES['plot']['Rent Burden by Age']
+                    }];
+                    var layout = {
+                        'font': {'color': '#020403'},
+                        'hoverlabel': {'align': 'left'},
+                        'margin': {'b': 40, 't': 40, 'r': 20},
+                        'autosize': true,
+                        'uirevision': true,
+                        'paper_bgcolor': '#FEF9F3',
+                        'plot_bgcolor': '#FEF9F3',
+                        'title': {'text': `<b>Percentage of Rent Burdened Individuals by Age</b>, ${selected_year}`, 'x': 0.05},
+                        'xaxis': {'title': {'text': '<b>Age Group</b>', 'ticklabelstandoff': 10, 'font': {'size': 14}}, 'showgrid': false, 'ticks': '', 'tickfont': {'color': '#666666', 'size': 13}},
+                        'yaxis': {'title': {'text': '<b>Percentage (%)</b>', 'standoff': 15, 'font': {'size': 14}}, 'ticksuffix': '%', 'gridcolor': '#E0E0E0', 'ticklabelstandoff': 5, 'ticks': '', 'tickfont': {'color': '#666666'}},
+                    };
+                }
             
-            return {'data': data, 'layout': layout};
+                return {'data': data, 'layout': layout};
+            }
         }
-    }
-    """,
-    Output('rent_plot', 'figure'),
-    [Input('measure-dropdown', 'value'),
-     Input('place-dropdown', 'value'),
-     Input('census-tract-dropdown', 'value'),
-     Input('year-dropdown', 'value'),
-     Input('MASTERFILE', 'data')
-    ]
-)
+        """,
+        Output('rent_plot', 'figure'),
+        [Input('measure-dropdown', 'value'),
+         Input('place-dropdown', 'value'),
+         Input('census-tract-dropdown', 'value'),
+         Input('year-dropdown', 'value'),
+         Input('SELECTION', 'data'),
+         Input('HOVERTEMPLATES', 'data')
+        ]
+    )
+
 
 
 